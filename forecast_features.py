@@ -0,0 +1,27 @@
+# Forecast feature layout and next-month row update, kept out of the Streamlit script
+# so the compiled helper is created once per process instead of on every rerun
+from numba import njit
+
+# Forecast inputs are fed to the scaler as plain ndarrays in training column order
+FEATURE_ORDER = ('quantity', 'price', 'product_encoded', 'city_encoded', 'last_month_profit',
+                 'avg_last_3_months_profit', 'month_over_month_change', 'cumulative_sales_to_date',
+                 'season', 'order_month', 'order_day', 'order_weekday', 'order_year')
+(I_LAST_PROFIT, I_AVG3_PROFIT, I_MOM_CHANGE, I_CUM_SALES,
+ I_SEASON, I_MONTH, I_YEAR) = (FEATURE_ORDER.index(f) for f in (
+    'last_month_profit', 'avg_last_3_months_profit', 'month_over_month_change',
+    'cumulative_sales_to_date', 'season', 'order_month', 'order_year'))
+
+@njit(cache=True)
+def build_next_row(row, first_pred):
+    next_row = row.copy()
+    next_month = row[I_MONTH] % 12 + 1
+    next_row[I_MONTH] = next_month
+    if next_month == 1:
+        next_row[I_YEAR] += 1
+    last_month_profit = row[I_LAST_PROFIT]
+    next_row[I_LAST_PROFIT] = first_pred
+    next_row[I_AVG3_PROFIT] = (row[I_AVG3_PROFIT] * 2 + first_pred) / 3
+    next_row[I_MOM_CHANGE] = (first_pred - last_month_profit) / last_month_profit if last_month_profit != 0 else 0.0
+    next_row[I_CUM_SALES] = row[I_CUM_SALES] + first_pred
+    next_row[I_SEASON] = (next_month % 12 + 3) // 3
+    return next_row
@@ -1,9 +1,43 @@
 # Refactored Streamlit App for Better Responsiveness
 import streamlit as st
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import altair as alt
+import hashlib
 import joblib
+import os
+import tempfile
 from calendar import month_name
+from sklearn.pipeline import Pipeline
+from forecast_features import FEATURE_ORDER, I_MONTH, build_next_row
+
+DASHBOARD_CSV = "synthetic_online_retail_data.xls"
+FORECAST_CSV  = "encoded_data.csv"
+
+# Only the columns the app actually reads are loaded from disk
+DASHBOARD_COLUMNS = ['order_date', 'city', 'gender', 'age', 'price', 'customer_id',
+                     'product_name', 'category_name', 'quantity', 'review_score']
+FORECAST_COLUMNS  = ['product_name', 'product_encoded', 'city', 'city_encoded']
+
+AGE_EDGES  = np.array([18, 25, 35, 45, 60])
+AGE_LABELS = ['<18','18-25','26-35','36-45','46-60','60+']
+
+# Static forecast-form options
+SEASONS       = ("Winter", "Spring", "Summer", "Fall")
+SEASON_CODES  = (1, 2, 3, 4)
+WEEKDAYS      = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+WEEKDAY_CODES = tuple(range(7))
+MONTHS        = tuple(range(1, 13))
+
+# Dashboard palette, shared by every chart builder
+CHART_COLORS = {
+    'monthly_sales': 'green',
+    'city_sales': 'teal',
+    'top_customers': 'skyblue',
+    'age_spend': 'coral',
+    'top_products': 'orange',
+    'avg_review': 'purple',
+}
 
 # --- Page Config ---
 st.set_page_config(layout="wide", page_title="Retail Analytics & Forecasting")
@@ -13,35 +47,151 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Cached Loading Functions ---
-@st.cache_data
-def load_dashboard_data():
-    df = pd.read_csv("synthetic_online_retail_data.xls")
-    df['order_date'] = pd.to_datetime(df['order_date'])
+def read_via_parquet(csv_path, **read_csv_kwargs):
+    # Convert the CSV to Snappy Parquet once (or when the CSV changes) and read that thereafter.
+    # The file name encodes the read options, so changing the columns never serves a stale copy.
+    options_key = hashlib.md5(repr(sorted(read_csv_kwargs.items())).encode()).hexdigest()[:8]
+    parquet_path = f"{os.path.splitext(csv_path)[0]}.{options_key}.parquet"
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        return pd.read_parquet(parquet_path, engine='pyarrow')
+
+    df = pd.read_csv(csv_path, engine='pyarrow', **read_csv_kwargs)
+    # Write to a temp file and rename it into place so concurrent readers never see a partial
+    # file; on a read-only deploy the CSV frame is served without a Parquet cache.
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(suffix='.parquet.tmp', dir=os.path.dirname(parquet_path) or '.')
+        os.close(fd)
+        df.to_parquet(tmp_path, engine='pyarrow', compression='snappy', index=False)
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
     return df
 
-@st.cache_data
-def load_forecast_data():
-    return pd.read_csv("encoded_data.csv")
+# Loaders take the source file's mtime as an argument so their cache entries
+# are reused across reruns and sessions, and invalidated only when the file changes.
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_dashboard_data(mtime):
+    df = read_via_parquet(DASHBOARD_CSV, usecols=DASHBOARD_COLUMNS, parse_dates=['order_date'])
+    df = df.astype({'price': 'float32', 'quantity': 'int32', 'age': 'int8',
+                    'review_score': 'float32', 'customer_id': 'int32',
+                    'city': 'category', 'gender': 'category',
+                    'product_name': 'category', 'category_name': 'category'})
+    # side='left' keeps pd.cut's right-closed bins: 18 -> '<18', 25 -> '18-25'
+    age_codes = np.searchsorted(AGE_EDGES, df['age'].to_numpy(), side='left').astype('int8')
+    df['age_group'] = pd.Categorical.from_codes(age_codes, AGE_LABELS)
+
+    # A sorted DatetimeIndex lets the monthly trend resample without re-indexing
+    df = df.sort_values('order_date').set_index('order_date')
+
+    # Per-city totals sorted descending once, so any top-N read is a slice
+    city_totals = df.groupby('city', observed=True, sort=False)['price'].sum().sort_values(ascending=False, kind='stable')
+
+    # Filter-independent aggregates, computed once instead of on every rerun
+    return {
+        'df': df,
+        'monthly_sales': df['price'].resample('MS').sum(),
+        'city_totals': city_totals,
+        'top_customers': df.groupby('customer_id', observed=True, sort=False)['price'].sum().nlargest(10),
+        'top_products': df.groupby('product_name', observed=True, sort=False)['quantity'].sum().nlargest(10),
+        'avg_review': df.groupby('category_name', observed=True, sort=False)['review_score'].mean().sort_values(),
+        'cities': sorted(df['city'].dropna().unique().tolist()),
+        'genders': sorted(df['gender'].dropna().unique().tolist()),
+    }
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_forecast_data(mtime):
+    df = read_via_parquet(FORECAST_CSV, usecols=FORECAST_COLUMNS)
+    return df.astype({'product_encoded': 'int16', 'city_encoded': 'int16'})
 
 @st.cache_resource
 def load_model_scaler():
     model = joblib.load("sales_forecast_model.pkl")
     scaler = joblib.load("sales_forecast_scaler.pkl")
-    return model, scaler
-
-@st.cache_resource
-def initialize_resources():
-    df_dash = load_dashboard_data()
-    df_forecast = load_forecast_data()
-    model, scaler = load_model_scaler()
-    return df_dash, df_forecast, model, scaler
-
-# --- Load all resources once ---
-df_dash, df_forecast, model, scaler = initialize_resources()
+    # Forecast rows are positional arrays, so FEATURE_ORDER must match the training columns
+    if tuple(scaler.feature_names_in_) != FEATURE_ORDER:
+        raise ValueError(f"FEATURE_ORDER {FEATURE_ORDER} does not match the scaler's "
+                         f"training columns {tuple(scaler.feature_names_in_)}")
+    # With the order verified, drop the names so ndarray input doesn't trigger sklearn's name check
+    del scaler.feature_names_in_
+    return Pipeline([('scaler', scaler), ('model', model)])
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def load_lookup_maps(mtime):
+    df = load_forecast_data(mtime)
+    product_table = df[['product_name', 'product_encoded']].drop_duplicates()
+    city_table    = df[['city', 'city_encoded']].drop_duplicates()
+    product_map = dict(zip(product_table['product_name'], product_table['product_encoded']))
+    city_map    = dict(zip(city_table['city'], city_table['city_encoded']))
+    return product_map, city_map
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def initialize_resources(dash_mtime):
+    dash = load_dashboard_data(dash_mtime)
+    pipe = load_model_scaler()
+    return dash, pipe
+
+# --- Load all resources once (again only if a data file changes) ---
+dash_mtime     = os.path.getmtime(DASHBOARD_CSV)
+forecast_mtime = os.path.getmtime(FORECAST_CSV)
+dash, pipe = initialize_resources(dash_mtime)
 
 # --- Lookup tables ---
-product_encoded_table = df_forecast[['product_name', 'product_encoded']].drop_duplicates()
-city_encoded_table    = df_forecast[['city', 'city_encoded']].drop_duplicates()
+PRODUCT_MAP, CITY_MAP = load_lookup_maps(forecast_mtime)
+
+# --- Forecast Helpers ---
+# The next-month row is built from the first prediction, so the two model calls
+# are inherently sequential; each is a single call through the scaler+model pipeline.
+def predict_profit(row):
+    return pipe.predict(row.reshape(1, -1))[0]
+
+# --- Chart Builders ---
+# Vega-Lite specs are rendered in the browser, so the server only ships JSON
+def line_chart(series, color, x_title, y_title):
+    data = series.rename_axis('x').reset_index(name='y')
+    return alt.Chart(data).mark_line(point=True, color=color).encode(
+        x=alt.X('x:T', title=x_title), y=alt.Y('y:Q', title=y_title))
+
+def bar_chart(series, color, horizontal=False):
+    data = series.rename_axis('label').reset_index(name='value')
+    # sort=None keeps the series order; horizontal bars are listed bottom-up like barh
+    if horizontal:
+        data = data.iloc[::-1]
+    label = alt.Y if horizontal else alt.X
+    value = alt.X if horizontal else alt.Y
+    return alt.Chart(data).mark_bar(color=color).encode(
+        label('label:N', sort=None, title=series.index.name),
+        value('value:Q', title=series.name))
+
+# Chart specs are built once and reused across reruns; the city and
+# age-group charts are cached per sidebar selection. They read the shared
+# dashboard dict from initialize_resources, which hands out the object
+# itself rather than an unpickled copy.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def static_charts(mtime):
+    dash = initialize_resources(mtime)[0]
+    return {
+        'monthly_sales': line_chart(dash['monthly_sales'], CHART_COLORS['monthly_sales'], "Month", "Total Sales"),
+        'top_customers': bar_chart(dash['top_customers'], CHART_COLORS['top_customers']),
+        'top_products': bar_chart(dash['top_products'], CHART_COLORS['top_products']),
+        'avg_review': bar_chart(dash['avg_review'], CHART_COLORS['avg_review'], horizontal=True),
+    }
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def city_chart(selected_city, mtime):
+    # A single selected city is one row of the precomputed totals, no mask or groupby needed
+    city_totals = initialize_resources(mtime)[0]['city_totals']
+    city_sales = city_totals.iloc[:10] if selected_city == "All" else city_totals.loc[[selected_city]]
+    return bar_chart(city_sales, CHART_COLORS['city_sales'], horizontal=True)
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def age_chart(selected_gender, mtime):
+    df = initialize_resources(mtime)[0]['df']
+    age_df = df if selected_gender == "All" else df[df['gender'] == selected_gender]
+    # Age groups keep the default key sort so the bars stay in bucket order
+    age_spend = age_df.groupby('age_group', observed=True)['price'].sum()
+    return bar_chart(age_spend, CHART_COLORS['age_spend'])
 
 # --- Tabs ---
 tab1, tab2 = st.tabs(["\U0001F4CA Retail Dashboard", "\U0001F4C8 Sales Profit Forecasting"])
@@ -52,64 +202,35 @@ with tab1:
 
     # Sidebar Filters
     st.sidebar.header("\U0001F50D Filters")
-    cities  = df_dash['city'].dropna().unique().tolist()
-    genders = df_dash['gender'].dropna().unique().tolist()
+    cities  = dash['cities']
+    genders = dash['genders']
 
     selected_city   = st.sidebar.selectbox("City for 'Sales by City'", ["All"] + cities)
     selected_gender = st.sidebar.selectbox("Gender for 'Spend by Age Group'", ["All"] + genders)
 
+    charts = static_charts(dash_mtime)
     tab1a, tab1b, tab1c = st.tabs(["\U0001F4C8 Sales & Trends", "\U0001F9CD\u200D\u2642\ufe0f Customers", "\U0001F9E9 Products"])
 
     with tab1a:
         st.subheader("Monthly Sales Trend")
-        monthly_sales = df_dash.set_index('order_date').resample('M')['price'].sum()
-        fig1, ax1 = plt.subplots(figsize=(12, 6))
-        monthly_sales.plot(marker='o', linestyle='-', color='green', ax=ax1)
-        ax1.set_title("Monthly Sales Trend")
-        ax1.set_xlabel("Month")
-        ax1.set_ylabel("Total Sales")
-        ax1.grid(True)
-        st.pyplot(fig1)
+        st.altair_chart(charts['monthly_sales'], width="stretch")
 
         st.subheader("Top 10 Sales by City")
-        data_city = df_dash if selected_city == "All" else df_dash[df_dash['city'] == selected_city]
-        city_sales = data_city.groupby('city')['price'].sum().nlargest(10)
-        fig2, ax2 = plt.subplots(figsize=(10, 6))
-        city_sales.plot(kind='barh', color='teal', ax=ax2)
-        ax2.set_title("Top 10 Sales by City")
-        st.pyplot(fig2)
+        st.altair_chart(city_chart(selected_city, dash_mtime), width="stretch")
 
     with tab1b:
         st.subheader("Top 10 Customers by Spend")
-        top_customers = df_dash.groupby('customer_id')['price'].sum().nlargest(10)
-        fig3, ax3 = plt.subplots(figsize=(10, 5))
-        top_customers.plot(kind='bar', color='skyblue', ax=ax3)
-        st.pyplot(fig3)
+        st.altair_chart(charts['top_customers'], width="stretch")
 
         st.subheader("Spend by Age Group")
-        age_df = df_dash.copy()
-        if selected_gender != "All":
-            age_df = age_df[age_df['gender'] == selected_gender]
-        age_df['age_group'] = pd.cut(age_df['age'], bins=[0, 18, 25, 35, 45, 60, 100],
-                                     labels=['<18','18-25','26-35','36-45','46-60','60+'])
-        age_spend = age_df.groupby('age_group')['price'].sum()
-        fig4, ax4 = plt.subplots(figsize=(8, 5))
-        age_spend.plot(kind='bar', color='coral', ax=ax4)
-        ax4.set_title("Spend by Age Group")
-        st.pyplot(fig4)
+        st.altair_chart(age_chart(selected_gender, dash_mtime), width="stretch")
 
     with tab1c:
         st.subheader("Top 10 Products by Quantity")
-        top_products = df_dash.groupby('product_name')['quantity'].sum().nlargest(10)
-        fig5, ax5 = plt.subplots(figsize=(10, 5))
-        top_products.plot(kind='bar', color='orange', ax=ax5)
-        st.pyplot(fig5)
+        st.altair_chart(charts['top_products'], width="stretch")
 
         st.subheader("Average Review Score by Category")
-        avg_review = df_dash.groupby('category_name')['review_score'].mean().sort_values()
-        fig6, ax6 = plt.subplots(figsize=(10, 5))
-        avg_review.plot(kind='barh', color='purple', ax=ax6)
-        st.pyplot(fig6)
+        st.altair_chart(charts['avg_review'], width="stretch")
 
     st.markdown("---")
     st.markdown("Made By Ahmed Sheikh ❤️")
@@ -131,25 +252,25 @@ with tab2:
             discount = st.number_input("Discount (%)", min_value=0.0, max_value=100.0, value=0.0, format="%.1f")
             discounted_price = price * (1 - discount / 100)
         with col4:
-            product_name = st.selectbox("Product Name", product_encoded_table['product_name'])
-            product_encoded = product_encoded_table.query("product_name == @product_name")['product_encoded'].iloc[0]
+            product_name = st.selectbox("Product Name", tuple(PRODUCT_MAP))
+            product_encoded = PRODUCT_MAP[product_name]
 
         col5, col6 = st.columns(2)
         with col5:
-            city = st.selectbox("City", city_encoded_table['city'])
-            city_encoded = city_encoded_table.query("city == @city")['city_encoded'].iloc[0]
+            city = st.selectbox("City", tuple(CITY_MAP))
+            city_encoded = CITY_MAP[city]
         with col6:
-            season = st.selectbox("Season", [1, 2, 3, 4], format_func=lambda x: ["Winter", "Spring", "Summer", "Fall"][x-1])
+            season = st.selectbox("Season", SEASON_CODES, format_func=lambda x: SEASONS[x-1])
 
         col7, col8 = st.columns(2)
         with col7:
-            order_month = st.selectbox("Order Month", list(range(1,13)), format_func=lambda x: month_name[x])
+            order_month = st.selectbox("Order Month", MONTHS, format_func=month_name.__getitem__)
         with col8:
             order_day = st.number_input("Order Day", min_value=1, max_value=31, step=1)
 
         col9, col10 = st.columns(2)
         with col9:
-            order_weekday = st.selectbox("Order Weekday", list(range(7)), format_func=lambda x: ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"][x])
+            order_weekday = st.selectbox("Order Weekday", WEEKDAY_CODES, format_func=WEEKDAYS.__getitem__)
         with col10:
             order_year = st.number_input("Order Year", min_value=2000, max_value=2100, step=1)
 
@@ -168,37 +289,15 @@ with tab2:
         submitted = st.form_submit_button("\U0001F4CA Forecast Profit")
 
         if submitted:
-            row = dict(
-                quantity=quantity,
-                price=discounted_price,
-                product_encoded=product_encoded,
-                city_encoded=city_encoded,
-                last_month_profit=last_month_profit,
-                avg_last_3_months_profit=avg_last_3_months_profit,
-                month_over_month_change=month_over_month_change,
-                cumulative_sales_to_date=cumulative_sales_to_date,
-                season=season,
-                order_month=order_month,
-                order_day=order_day,
-                order_weekday=order_weekday,
-                order_year=order_year
-            )
-            df_input = pd.DataFrame([row])
-            scaled_input = scaler.transform(df_input)
-            first_pred = model.predict(scaled_input)[0]
-
-            next_row = row.copy()
-            next_row['order_month'] = (order_month % 12) + 1
-            next_row['order_year'] += 1 if next_row['order_month'] == 1 else 0
-            next_row['last_month_profit'] = first_pred
-            next_row['avg_last_3_months_profit'] = (avg_last_3_months_profit * 2 + first_pred)/3
-            next_row['month_over_month_change'] = ((first_pred - last_month_profit)/last_month_profit if last_month_profit else 0.0)
-            next_row['cumulative_sales_to_date'] = cumulative_sales_to_date + first_pred
-            next_row['season'] = ((next_row['order_month'] % 12 + 3) // 3)
-
-            df_next = pd.DataFrame([next_row])
-            scaled_next = scaler.transform(df_next)
-            second_pred = model.predict(scaled_next)[0]
+            row = np.array([quantity, discounted_price, product_encoded, city_encoded,
+                            last_month_profit, avg_last_3_months_profit, month_over_month_change,
+                            cumulative_sales_to_date, season, order_month, order_day,
+                            order_weekday, order_year], dtype=np.float64)
+            first_pred = predict_profit(row)
+
+            next_row = build_next_row(row, first_pred)
+            next_month = int(next_row[I_MONTH])
+            second_pred = predict_profit(next_row)
 
             st.balloons()
             st.markdown(f"""
@@ -206,8 +305,8 @@ with tab2:
                   <h3>\U0001F4B0 Profit Forecast</h3>
                   <p style='font-size:24px;'>For <strong>{month_name[order_month]}</strong>: 
                     <span style='color:#00ffcc;'>{first_pred:.2f}</span></p>
-                  <p style='font-size:20px;'>Next Month (<strong>{month_name[next_row['order_month']]}</strong>): 
+                  <p style='font-size:20px;'>Next Month (<strong>{month_name[next_month]}</strong>): 
                     <span style='color:#ffd700;'>{second_pred:.2f}</span></p>
                 </div>
             """, unsafe_allow_html=True)
-            st.toast(f"Forecast done for {month_name[order_month]} & {month_name[next_row['order_month']]}", icon="\U0001F4C8")
+            st.toast(f"Forecast done for {month_name[order_month]} & {month_name[next_month]}", icon="\U0001F4C8")